@@ -1,30 +1,130 @@
 import os
+import sys
 import time
 import shutil
-import json
+import hashlib
+import mmap
+import sqlite3
+import errno
+import unicodedata
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
 import gspread
+from requests.adapters import HTTPAdapter
 from google import genai
 from google.genai import types
+from google.genai import errors as genai_errors
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict
+from pydantic_core import from_json
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+# On Linux, inotify is used directly instead of watchdog's Observer
+inotify_simple = None
+if sys.platform.startswith('linux'):
+    try:
+        import inotify_simple
+    except ImportError:
+        pass
+
 # 1. Load environment variables
 load_dotenv()
 
 # 2. Configure the NEW Google GenAI Client
 # The new SDK automatically finds your GEMINI_API_KEY in the .env file!
-client = genai.Client() 
+# Created on first use, so importing this file doesn't touch the network.
+@lru_cache(maxsize=1)
+def get_client():
+    return genai.Client()
 
 # 3. Configure Google Sheets
-gc = gspread.service_account(filename='credentials.json')
-# UPDATE THIS LINE:
-sheet = gc.open('Data').sheet1 
+@lru_cache(maxsize=1)
+def get_sheet():
+    gc = gspread.service_account(filename='credentials.json')
+    # gspread reuses one requests session for every call; give it a bigger
+    # keep-alive pool so connections aren't dropped and re-handshaked
+    gc.http_client.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+    # UPDATE THIS LINE:
+    return gc.open('Data').sheet1
+
+# Using the high-volume free tier model
+MODEL = 'gemini-2.5-flash-lite'
 
 # 4. Define our folder paths
-IN_FOLDER = "receipts_in"
-PROCESSED_FOLDER = "receipts_processed"
-ERROR_FOLDER = "receipts_error"
+IN_FOLDER = Path("receipts_in")
+PROCESSED_FOLDER = Path("receipts_processed")
+ERROR_FOLDER = Path("receipts_error")
+
+# How long the watchdog waits for more PDFs before sending a batch to Gemini
+BATCH_DELAY_SECONDS = 5
+
+# A new PDF is considered fully written once its size has stayed the same
+# for SETTLE_SECONDS, checked every POLL_SECONDS.
+SETTLE_SECONDS = 0.3
+EMPTY_SETTLE_SECONDS = 5
+POLL_SECONDS = 0.1
+
+# Large backlogs are split into batches of this many receipts, and up to
+# MAX_WORKERS batches are sent to Gemini at the same time.
+BATCH_SIZE = 10
+MAX_WORKERS = 8
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+def log_errors(future):
+    # Otherwise an exception in a background job disappears without a trace
+    if not future.cancelled() and future.exception() is not None:
+        print("❌ Unexpected error in a background job:")
+        traceback.print_exception(future.exception())
+
+def submit(fn, *args):
+    future = executor.submit(fn, *args)
+    future.add_done_callback(log_errors)
+    return future
+
+# Receipts whose rows are waiting to be written to Google Sheets, as
+# (file_path, rows) pairs. They are written every FLUSH_INTERVAL_SECONDS, or
+# sooner once FLUSH_MAX_ROWS have piled up, at most FLUSH_MAX_ROWS per request.
+# A PDF stays in IN_FOLDER until its rows are in the sheet.
+FLUSH_INTERVAL_SECONDS = 10
+FLUSH_MAX_ROWS = 500
+pending_receipts = []
+pending_receipts_lock = threading.Lock()
+flush_lock = threading.Lock()
+flush_requested = threading.Event()
+
+# PDFs that are queued or being processed, so a late create/modify event
+# doesn't send the same file to Gemini twice. A PDF is released once it has
+# been moved out of IN_FOLDER.
+in_flight = set()
+in_flight_lock = threading.Lock()
+
+def claim(file_path):
+    with in_flight_lock:
+        if os.path.abspath(file_path) in in_flight:
+            return False
+        in_flight.add(os.path.abspath(file_path))
+        return True
+
+def release(file_path):
+    with in_flight_lock:
+        in_flight.discard(os.path.abspath(file_path))
+
+# Remember which PDFs are already uploaded to Gemini so the same receipt
+# isn't uploaded twice. Gemini deletes uploaded files after 48 hours.
+UPLOAD_CACHE_TTL_SECONDS = 47 * 60 * 60
+upload_cache_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def get_upload_cache():
+    upload_cache = sqlite3.connect("upload_cache.db", check_same_thread=False)
+    upload_cache.execute("CREATE TABLE IF NOT EXISTS files (hash TEXT PRIMARY KEY, name TEXT, uploaded_at REAL)")
+    return upload_cache
 
 # 5. The Master Prompt
 PROMPT = """
@@ -55,93 +155,498 @@ You must respond strictly in valid JSON format using this exact schema:
 }
 """
 
-def process_receipt(file_path):
-    print(f"\n📄 New receipt detected: {os.path.basename(file_path)}")
-    print("🧠 Sending to Gemini for analysis...")
-    
+# Several receipts can be sent in one request. Each PDF is preceded by a
+# "File: <name>" line so Gemini can tell us which receipt is which.
+BATCH_PROMPT = PROMPT + """
+You may receive several PDF receipts at once. Each one is preceded by a line "File: <filename>".
+The schema above describes one receipt. Do not return it on its own; instead return a single JSON object mapping each filename to its receipt, even when there is only one receipt:
+{
+  "<filename>": {"receipt_metadata": {...}, "items": [...]}
+}
+"""
+
+# Built once and reused, instead of converting the prompt string on every request
+PROMPT_PART = types.Part(text=BATCH_PROMPT)
+
+# The prompt never changes, so if it's big enough for Gemini's explicit
+# caching it is stored once on Gemini's side as cached content and only
+# referenced by name in each request. The cache is refreshed an hour before it
+# expires. Smaller prompts (like the current one) are sent as a system
+# instruction with every request instead.
+PROMPT_CACHE_TTL_SECONDS = 24 * 60 * 60
+PROMPT_CACHE_MIN_TOKENS = 1024 # Gemini's minimum for the 2.5 Flash models
+prompt_cache = None
+
+def create_prompt_cache():
+    global prompt_cache
+    prompt_cache = None
     try:
-        # Upload the PDF using the NEW SDK
-        receipt_file = client.files.upload(file=file_path)
-        
-        # Ask Gemini to generate the JSON response using the NEW SDK
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-lite', # Using the high-volume free tier model
-            contents=[receipt_file, PROMPT],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
+        tokens = get_client().models.count_tokens(model=MODEL, contents=BATCH_PROMPT).total_tokens
+        if tokens < PROMPT_CACHE_MIN_TOKENS:
+            return False
+        prompt_cache = get_client().caches.create(
+            model=MODEL,
+            config=types.CreateCachedContentConfig(
+                system_instruction=PROMPT_PART,
+                ttl=f"{PROMPT_CACHE_TTL_SECONDS}s"
+            )
+        )
+    except Exception as e:
+        print(f"⚠️ Could not cache the prompt, sending it with every request instead: {e}")
+        return False
+    return True
+
+def refresh_prompt_cache():
+    while prompt_cache is not None:
+        time.sleep(PROMPT_CACHE_TTL_SECONDS - 60 * 60)
+        try:
+            get_client().caches.update(
+                name=prompt_cache.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{PROMPT_CACHE_TTL_SECONDS}s")
+            )
+        except Exception:
+            create_prompt_cache()
+
+def generation_config():
+    if prompt_cache is not None:
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            cached_content=prompt_cache.name
+        )
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        system_instruction=PROMPT_PART
+    )
+
+# Rate limits (429) and server errors (5xx) from Gemini or Sheets are usually
+# gone after a few seconds, so those calls are retried with backoff before the
+# receipt is given up on.
+def is_transient_error(e):
+    if isinstance(e, genai_errors.APIError):
+        code = e.code
+    elif isinstance(e, gspread.exceptions.APIError):
+        code = e.response.status_code
+    else:
+        return False
+    return code == 429 or code >= 500
+
+retry_transient = retry(
+    retry=retry_if_exception(is_transient_error),
+    wait=wait_exponential_jitter(initial=1, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True
+)
+
+@retry_transient
+def generate(contents):
+    return get_client().models.generate_content(
+        model=MODEL,
+        contents=contents,
+        config=generation_config()
+    )
+
+@retry_transient
+def append_rows(rows):
+    get_sheet().append_rows(rows, value_input_option='USER_ENTERED')
+
+def move_file(src, dst):
+    # A plain rename when the folders are on the same filesystem, which they usually are
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+    finally:
+        release(src)
+
+def check_pdf(file_path):
+    # Catch files that aren't PDFs, or were only partly copied, before uploading them
+    with open(file_path, 'rb') as f:
+        if f.read(5) != b'%PDF-':
+            raise ValueError("not a PDF")
+        f.seek(max(os.fstat(f.fileno()).st_size - 1024, 0))
+        if b'%%EOF' not in f.read():
+            raise ValueError("the PDF is truncated")
+
+def is_hemkop_receipt(file_path):
+    # A quick local check so PDFs that obviously aren't Hemköp receipts never
+    # reach Gemini. Most PDFs compress their text, in which case we can't tell
+    # and let Gemini decide.
+    with open(file_path, 'rb') as f:
+        head = f.read(65536)
+    if b'Hemk' in head or b'HEMK' in head:
+        return True
+    return b'/Filter' in head
+
+def upload_receipt(file_path):
+    # Hash straight from the memory-mapped file instead of reading it into memory
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            h = hashlib.sha256().hexdigest()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h = hashlib.sha256(m).hexdigest()
+    
+    with upload_cache_lock:
+        cached = get_upload_cache().execute("SELECT name, uploaded_at FROM files WHERE hash = ?", (h,)).fetchone()
+    if cached and time.time() - cached[1] < UPLOAD_CACHE_TTL_SECONDS:
+        try:
+            return get_client().files.get(name=cached[0])
+        except Exception:
+            pass # The file is gone on Gemini's side, upload it again
+    
+    # The SDK reads an open file in chunks for its resumable upload
+    with open(file_path, 'rb') as f:
+        receipt_file = get_client().files.upload(
+            file=f,
+            config=types.UploadFileConfig(
+                mime_type="application/pdf",
+                display_name=os.path.basename(file_path)
             )
         )
+    with upload_cache_lock:
+        get_upload_cache().execute("INSERT OR REPLACE INTO files (hash, name, uploaded_at) VALUES (?, ?, ?)", (h, receipt_file.name, time.time()))
+        get_upload_cache().commit()
+    return receipt_file
+
+# The shape of one receipt in Gemini's response, matching the prompt's schema.
+# A receipt without metadata or items is rejected instead of producing no rows.
+# The fields themselves are lenient: numbers are accepted as text, prices Gemini
+# writes as text (e.g. "100,50") are kept as-is, and missing values stay blank.
+class Meta(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    store: str | None = None
+    date: str | None = None
+    total_receipt_cost: float | str | None = None
+
+class Item(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    product_name: str | None = None
+    category: str | None = None
+    calories_per_100g: float | str | None = None
+    quantity_or_weight: str | None = None
+    item_total_price: float | str | None = None
+
+class Receipt(BaseModel):
+    receipt_metadata: Meta
+    items: list[Item]
+
+def blank(value):
+    return "" if value is None else value
+
+def receipt_to_rows(receipt):
+    meta = receipt.receipt_metadata
+    date, store, total = blank(meta.date), blank(meta.store), blank(meta.total_receipt_cost)
+    return [
+        [
+            date,
+            store,
+            blank(item.product_name),
+            blank(item.category),
+            blank(item.calories_per_100g),
+            blank(item.quantity_or_weight),
+            blank(item.item_total_price),
+            total
+        ]
+        for item in receipt.items
+    ]
+
+def receipts_by_name(data, names):
+    # names are already NFC-normalized
+    # Despite the prompt, Gemini sometimes answers a single receipt with the
+    # plain receipt schema
+    if len(names) == 1 and "receipt_metadata" in data:
+        return {names[0]: data}
+    # Filenames may come back in a different Unicode form (e.g. "ö" decomposed)
+    return {unicodedata.normalize("NFC", name): receipt for name, receipt in data.items()}
+
+def process_receipts(file_paths):
+    receipts = []
+    for file_path in file_paths:
+        try:
+            check_pdf(file_path)
+            if not is_hemkop_receipt(file_path):
+                raise ValueError("not a Hemköp receipt")
+        except ValueError as e:
+            print(f"❌ Skipping {os.path.basename(file_path)}: {e}")
+            finish_receipt(file_path, ERROR_FOLDER)
+            continue
+        except OSError as e:
+            print(f"❌ Could not read {file_path}: {e}")
+            release(file_path)
+            continue
+        receipts.append(file_path)
+    if not receipts:
+        return
+    file_paths = receipts
+    
+    # Compared against the filenames in Gemini's answer, so use one Unicode form
+    names = [unicodedata.normalize("NFC", os.path.basename(p)) for p in file_paths]
+    for name in names:
+        print(f"\n📄 New receipt detected: {name}")
+    print(f"🧠 Sending {len(file_paths)} receipt(s) to Gemini for analysis...")
+    
+    try:
+        # Upload all the PDFs at once, then ask about them in one request
+        with ThreadPoolExecutor(max_workers=len(file_paths)) as ex:
+            receipt_files = list(ex.map(upload_receipt, file_paths))
         
-        # Parse the JSON response into Python dictionaries
-        data = json.loads(response.text)
-        meta = data.get("receipt_metadata", {})
-        items = data.get("items", [])
+        contents = []
+        for name, receipt_file in zip(names, receipt_files):
+            contents += [f"File: {name}", receipt_file]
         
-        rows_to_add = []
-        for item in items:
-            row = [
-                meta.get("date", ""),
-                meta.get("store", ""),
-                item.get("product_name", ""),
-                item.get("category", ""),
-                item.get("calories_per_100g", ""),
-                item.get("quantity_or_weight", ""),
-                item.get("item_total_price", ""),
-                meta.get("total_receipt_cost", "")
-            ]
-            rows_to_add.append(row)
+        # Ask Gemini to generate the JSON response using the NEW SDK
+        response = generate(contents)
         
+        # Parse the JSON response; each receipt is validated on its own below
+        # so one bad receipt doesn't fail the whole batch
+        data = receipts_by_name(from_json(response.text), names)
+    except Exception as e:
+        print(f"❌ Error processing {', '.join(names)}: {e}")
+        for file_path in file_paths:
+            finish_receipt(file_path, ERROR_FOLDER)
+        return
+    
+    for file_path, name in zip(file_paths, names):
+        try:
+            rows = receipt_to_rows(Receipt.model_validate(data[name]))
+        except Exception as e:
+            print(f"❌ Error processing {file_path}: {e}")
+            finish_receipt(file_path, ERROR_FOLDER)
+            continue
+        with pending_receipts_lock:
+            pending_receipts.append((file_path, rows))
+            if sum(len(r) for _, r in pending_receipts) > FLUSH_MAX_ROWS:
+                flush_requested.set()
+
+def finish_receipt(file_path, folder):
+    # The user may have moved or deleted the PDF while it was waiting; that
+    # mustn't stop the rest of the flush
+    try:
+        move_file(file_path, folder / os.path.basename(file_path))
+    except OSError as e:
+        print(f"⚠️ Could not move {file_path} to '{folder}': {e}")
+
+def write_receipts(receipts):
+    rows_to_add = [row for _, rows in receipts for row in rows]
+    try:
         if rows_to_add:
             print(f"📊 Sending {len(rows_to_add)} items to Google Sheets...")
-            sheet.append_rows(rows_to_add)
+            append_rows(rows_to_add)
             print("✅ Success!")
+    except Exception as e:
+        print(f"❌ Error sending rows to Google Sheets: {e}")
+        if isinstance(e, gspread.exceptions.APIError) and not is_transient_error(e):
+            # The sheet rejected the rows, so retrying won't help
+            for file_path, _ in receipts:
+                finish_receipt(file_path, ERROR_FOLDER)
+            return []
+        # Rate limits, server or network errors; keep them for the next flush
+        return receipts
+    
+    # Move the PDFs to the processed folder now that their rows are saved
+    for file_path, _ in receipts:
+        finish_receipt(file_path, PROCESSED_FOLDER)
+    return []
+
+def flush_rows():
+    global pending_receipts
+    with flush_lock:
+        # Swap in a fresh list rather than copying the pending receipts
+        with pending_receipts_lock:
+            receipts, pending_receipts = pending_receipts, []
         
-        # Move the PDF to the processed folder
-        shutil.move(file_path, os.path.join(PROCESSED_FOLDER, os.path.basename(file_path)))
+        # Send at most FLUSH_MAX_ROWS rows per request, keeping each receipt's
+        # rows together
+        chunks = []
+        chunk, chunk_rows = [], 0
+        for receipt in receipts:
+            if chunk and chunk_rows + len(receipt[1]) > FLUSH_MAX_ROWS:
+                chunks.append(chunk)
+                chunk, chunk_rows = [], 0
+            chunk.append(receipt)
+            chunk_rows += len(receipt[1])
+        if chunk:
+            chunks.append(chunk)
         
-    except Exception as e:
-        print(f"❌ Error processing {file_path}: {e}")
-        shutil.move(file_path, os.path.join(ERROR_FOLDER, os.path.basename(file_path)))
+        failed = []
+        for i, chunk in enumerate(chunks):
+            try:
+                failed += write_receipts(chunk)
+            except Exception:
+                # Keep this chunk and the ones not tried yet for the next flush
+                print("❌ Unexpected error while flushing rows:")
+                traceback.print_exc()
+                for rest in chunks[i:]:
+                    failed += rest
+                break
+        
+        if failed:
+            with pending_receipts_lock:
+                pending_receipts[:0] = failed
+        return len(failed)
+
+def flusher():
+    while True:
+        flush_requested.wait(FLUSH_INTERVAL_SECONDS)
+        flush_requested.clear()
+        try:
+            flush_rows()
+        except Exception:
+            print("❌ Unexpected error in the flusher:")
+            traceback.print_exc()
+
+def wait_until_written(file_path):
+    # Wait until the file has stopped growing, i.e. the copy into the folder is
+    # done. An empty file gets longer to start, but if it stays empty it is
+    # passed on anyway and rejected by check_pdf.
+    prev = -1
+    stable_since = time.monotonic()
+    while True:
+        cur = os.path.getsize(file_path)
+        if cur != prev:
+            prev = cur
+            stable_since = time.monotonic()
+        elif time.monotonic() - stable_since >= (EMPTY_SETTLE_SECONDS if cur == 0 else SETTLE_SECONDS):
+            return
+        time.sleep(POLL_SECONDS)
 
 # 6. The "Watchdog" that monitors the folder 24/7
+# Every create/modify event for a PDF restarts a short per-file timer, so a
+# long copy only triggers once it's finished. Finished PDFs are queued, and once
+# no new file has arrived for BATCH_DELAY_SECONDS the whole queue is sent to
+# Gemini as one batch.
 class ReceiptHandler(FileSystemEventHandler):
+    def __init__(self):
+        self.pending = queue.Queue()
+        self.timer = None
+        self.file_timers = {}
+        self.lock = threading.Lock()
+        self.stopped = False
+
     def on_created(self, event):
+        self.watch(event)
+
+    def on_modified(self, event):
+        self.watch(event)
+
+    def watch(self, event):
         if not event.is_directory and event.src_path.lower().endswith('.pdf'):
-            time.sleep(2)
-            process_receipt(event.src_path)
+            with self.lock:
+                if self.stopped:
+                    return
+                if event.src_path in self.file_timers:
+                    self.file_timers[event.src_path].cancel()
+                timer = threading.Timer(SETTLE_SECONDS, lambda: submit(self.settle, event.src_path, timer))
+                self.file_timers[event.src_path] = timer
+                timer.start()
+
+    def settle(self, file_path, timer):
+        try:
+            wait_until_written(file_path)
+        except OSError:
+            return # The file was moved or deleted before it finished
+        finally:
+            # A newer event may have started another timer for this file meanwhile
+            with self.lock:
+                if self.file_timers.get(file_path) is timer:
+                    del self.file_timers[file_path]
+        self.enqueue(file_path)
+
+    def enqueue(self, file_path):
+        # Already queued or being processed, e.g. a modify event after settling
+        # or a second CLOSE_WRITE from inotify
+        if not claim(file_path):
+            return
+        self.pending.put(file_path)
+        with self.lock:
+            if self.stopped:
+                return
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(BATCH_DELAY_SECONDS, self.flush)
+            self.timer.start()
+
+    def stop(self):
+        # Cancel the timers so nothing is submitted after the executor shuts down
+        with self.lock:
+            self.stopped = True
+            if self.timer:
+                self.timer.cancel()
+            for timer in self.file_timers.values():
+                timer.cancel()
+
+    def flush(self):
+        file_paths = []
+        while not self.pending.empty():
+            file_paths.append(self.pending.get())
+        if file_paths:
+            submit(process_receipts, file_paths)
+
+def watch_with_inotify(handler):
+    # CLOSE_WRITE only fires once the writer has closed the file, and MOVED_TO
+    # covers files moved in from elsewhere, so there's nothing to wait for
+    notifier = inotify_simple.INotify()
+    notifier.add_watch(IN_FOLDER, inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.MOVED_TO)
+    while True:
+        for event in notifier.read():
+            if event.name.lower().endswith('.pdf'):
+                handler.enqueue(str(IN_FOLDER / event.name))
 
 if __name__ == "__main__":
     print(f"Waiting for new PDF in '{IN_FOLDER}'")
     
-    # --- NEW FEATURE: Startup Folder Check ---
-    # Look for any PDFs that are already in the folder
-    existing_pdfs = [f for f in os.listdir(IN_FOLDER) if f.lower().endswith('.pdf')]
+    if create_prompt_cache():
+        threading.Thread(target=refresh_prompt_cache, daemon=True).start()
     
-    if not existing_pdfs:
-        print(f"📭 The '{IN_FOLDER}' folder is currently empty. Waiting for you to drop a PDF here!")
-    else:
-        print(f"📂 Found {len(existing_pdfs)} existing PDF(s) on startup. Processing them now...")
-        for pdf in existing_pdfs:
-            process_receipt(os.path.join(IN_FOLDER, pdf))
-            
-        # --- NEW COMPLETION MESSAGES ---
-        print("\n✅ All caught up! Finished processing the startup queue.")
-        print(f"👀 Now watching the '{IN_FOLDER}' folder for new PDFs...")
-        # -------------------------------
-    # -----------------------------------------
-
-    print("Press Ctrl+C to stop the script.\n")
+    threading.Thread(target=flusher, daemon=True).start()
     
     event_handler = ReceiptHandler()
-    observer = Observer()
-    observer.schedule(event_handler, IN_FOLDER, recursive=False)
-    observer.start()
-    
+    observer = None
     try:
+        # --- NEW FEATURE: Startup Folder Check ---
+        # Look for any PDFs that are already in the folder
+        with os.scandir(IN_FOLDER) as it:
+            existing_pdfs = [e.path for e in it if not e.is_dir(follow_symlinks=False) and e.name.lower().endswith('.pdf')]
+        for pdf in existing_pdfs:
+            claim(pdf)
+        
+        if not existing_pdfs:
+            print(f"📭 The '{IN_FOLDER}' folder is currently empty. Waiting for you to drop a PDF here!")
+        else:
+            print(f"📂 Found {len(existing_pdfs)} existing PDF(s) on startup. Processing them now...")
+            batches = [existing_pdfs[i:i + BATCH_SIZE] for i in range(0, len(existing_pdfs), BATCH_SIZE)]
+            wait([submit(process_receipts, batch) for batch in batches])
+            flush_rows()
+                
+            # --- NEW COMPLETION MESSAGES ---
+            print("\n✅ All caught up! Finished processing the startup queue.")
+            print(f"👀 Now watching the '{IN_FOLDER}' folder for new PDFs...")
+            # -------------------------------
+        # -----------------------------------------
+
+        print("Press Ctrl+C to stop the script.\n")
+        
+        if inotify_simple is not None:
+            threading.Thread(target=watch_with_inotify, args=(event_handler,), daemon=True).start()
+        else:
+            observer = Observer()
+            observer.schedule(event_handler, str(IN_FOLDER), recursive=False)
+            observer.start()
+        
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        observer.stop()
+        if observer:
+            observer.stop()
+        event_handler.stop()
+        executor.shutdown(wait=True, cancel_futures=True)
+        unsaved = flush_rows()
+        if unsaved:
+            # Their PDFs are still in IN_FOLDER, so they'll be redone on the next start
+            print(f"⚠️ Could not save {unsaved} receipt(s) to Google Sheets. They were left in '{IN_FOLDER}'.")
         print("\nScript stopped.")
     
-    observer.join()
\ No newline at end of file
+    if observer:
+        observer.join()
\ No newline at end of file